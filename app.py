@@ -1,14 +1,19 @@
 # app.py
-import os, re, html, mimetypes, base64, json, time, io
+import os, re, json, html, mimetypes, base64, time, io, shlex, threading
 from urllib.parse import urlencode
+from http.cookiejar import DefaultCookiePolicy
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from sqlalchemy import create_engine, text
-from xml.dom import minidom
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError
+import lxml.etree as ET
 from datetime import datetime, timedelta
-import streamlit.components.v1 as components  # HTML+JS en iframe
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
 
 # ===================== PAGE / FAVICON =====================
 FAVICON_PATH = "assets/favicon.png"
@@ -17,10 +22,11 @@ st.set_page_config(
     page_icon=FAVICON_PATH if os.path.exists(FAVICON_PATH) else None,
     layout="wide",
 )
-if not os.path.exists(FAVICON_PATH):
-    # Fallback para evitar el ícono default de Streamlit
-    _PNG_DOT = ("iVBORw0KGgoAAAANSUhEUgAAAA4AAAAOCAYAAAAfSC3RAAAALElEQVQ4T2NkwA7+"
-                "z0AEYQxgGJgYFQYwQ0gYg8gC4i1Q0A0Ew0gqA0kQAAH1kEKyBd8zMAAAAASUVORK5CYII=")
+_PNG_DOT = ("iVBORw0KGgoAAAANSUhEUgAAAA4AAAAOCAYAAAAfSC3RAAAALElEQVQ4T2NkwA7+"
+            "z0AEYQxgGJgYFQYwQ0gYg8gC4i1Q0A0Ew0gqA0kQAAH1kEKyBd8zMAAAAASUVORK5CYII=")
+if not os.path.exists(FAVICON_PATH) and 'favicon_injected' not in st.session_state:
+    # Fallback para evitar el ícono default de Streamlit (se inyecta una vez por sesión)
+    st.session_state.favicon_injected = True
     st.markdown(f"""
     <script>(function(){{
       const l=document.querySelector("link[rel='icon']")||document.createElement('link');
@@ -30,6 +36,7 @@ if not os.path.exists(FAVICON_PATH):
     """, unsafe_allow_html=True)
 
 # ===================== TÍTULO (Logo + texto) =====================
+@st.cache_data(show_spinner=False)
 def data_uri(path: str) -> str | None:
     try:
         mime = mimetypes.guess_type(path)[0] or "image/png"
@@ -51,11 +58,23 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # ===================== UTILS GENERALES =====================
-def prettify_xml(xml_text: str) -> str:
+_XML_LOCAL = threading.local()  # un parser por hilo: lxml no admite compartirlo entre sesiones concurrentes
+XML_HEAD_CHARS = 64 * 1024  # vista previa de Parametros; el resto se carga a pedido
+XML_ID_OPTIONS = 200  # Job Ids ofrecidos en el selector de XML; otros se escriben a mano
+
+def _xml_parser() -> ET.XMLParser:
+    parser = getattr(_XML_LOCAL, "parser", None)
+    if parser is None:
+        parser = _XML_LOCAL.parser = ET.XMLParser(remove_blank_text=True, recover=True)
+    return parser
+
+def prettify_xml(xml_text: str | bytes) -> str:
     try:
-        return minidom.parseString(xml_text.encode('utf-8')).toprettyxml(indent='  ')
+        data = xml_text.encode('utf-8') if isinstance(xml_text, str) else xml_text
+        root = ET.fromstring(data, _xml_parser())
+        return ET.tostring(root, pretty_print=True, encoding='unicode')
     except Exception:
-        return xml_text
+        return xml_text.decode("utf-8", "replace") if isinstance(xml_text, bytes) else xml_text
 
 def yesno(val, default_yes=True):
     s = str(val).lower()
@@ -63,22 +82,96 @@ def yesno(val, default_yes=True):
     if s in ("0","false","no"): return "no"
     return "yes" if default_yes else "no"
 
-def esc(x):  # escape seguro para HTML
-    return html.escape("" if x is None else str(x))
+# Subcadenas literales de MotivoRechazo que marcan un job como crítico (sin comodines ni regex)
+CRITICAL_MOTIVOS = (
+    "Error al dar de alta la empresa",
+    "Invalid argument supplied for foreach()",
+    "No existe la empresa, no se creo el usuario",
+    "No existe el usuario, no se creo el usuario",
+)
+
+# ===================== CSS =====================
+HIDE_SIDEBAR_CSS = "[data-testid='stSidebar'],[data-testid='collapsedControl']{display:none!important}"
+HIDE_PASSWORD_TOGGLE_CSS = 'button[aria-label="Show password text"],button[aria-label="Hide password text"]{display:none!important}'
+SEMAPHORE_CSS = """
+.sem-card{padding:20px;border-radius:16px;font-weight:900;font-size:28px;text-align:center;margin-bottom:14px;}
+.sem-err{background:#ff4d4f;color:white;box-shadow:0 8px 20px rgba(255,77,79,.45);}
+.sem-ok{background:#06c1671a;color:#0e7a3f;border:3px solid #23c16b;box-shadow:0 8px 20px rgba(35,193,107,.35);}
+"""
+RESULTS_TABLE_CSS = """
+.gs1tbl-wrap{max-height:2000px;overflow:auto;}
+.gs1tbl{width:100%;border-collapse:collapse;}
+.gs1tbl th,.gs1tbl td{border:1px solid #e5e7eb;padding:8px;font-size:14px;vertical-align:top;}
+.gs1tbl th{background:#f8fafc;text-align:left;position:sticky;top:0;z-index:1;}
+.gs1tbl .row-critical td{background:#ff4d4f;color:white;}
+.gs1tbl .row-ok td{background:#eaffea;color:black;}
+"""
+# Un único bloque <style> por rerun una vez conectados
+_STATIC_CSS = f"<style>{HIDE_SIDEBAR_CSS}{SEMAPHORE_CSS}{RESULTS_TABLE_CSS}</style>"
+
+# ===================== TABLA DE RESULTADOS =====================
+USE_FAST_RENDER = True  # False: st.dataframe + Styler (grilla virtualizada)
+
+RESULTS_HEADERS = ('Id','FechaAlta','Plataforma','CodEmpre','RazonSocial','CUIT','Respuestas')
+_RESULTS_HEAD = ("<div class='gs1tbl-wrap'><table class='gs1tbl'><thead><tr>"
+                 + "".join(f"<th>{h}</th>" for h in RESULTS_HEADERS) + "</tr></thead><tbody>")
+_RESULTS_TAIL = "</tbody></table></div>"
+
+def _esc_cell(x) -> str:
+    return "" if pd.isna(x) else html.escape(str(x))
+
+def results_table_html(frame: pd.DataFrame, crit) -> str:
+    """Tabla HTML plana: escape por columna y una fila por string, sin Styler ni Arrow."""
+    # En categóricas (Plataforma) map escapa solo las categorías y deja NaN: de ahí el fillna final
+    cells = [
+        frame[c].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('') if c == 'FechaAlta'
+        else frame[c].map(_esc_cell).astype(object).fillna('')
+        for c in frame.columns
+    ]
+    classes = np.where(crit, 'row-critical', 'row-ok')
+    rows = ["<tr class='" + cls + "'><td>" + "</td><td>".join(vals) + "</td></tr>"
+            for cls, vals in zip(classes, zip(*cells))]
+    return _RESULTS_HEAD + "".join(rows) + _RESULTS_TAIL
 
 # ===================== MONITOR GS1→EDI =====================
 def monitor_ui():
     @st.cache_resource(show_spinner=False)
     def get_engine(server, database, user, password, encrypt="yes", trust="yes"):
-        url = (
-            f"mssql+pytds://{user}:{password}@{server}:1433/{database}"
-            f"?encrypt={yesno(encrypt)}&trustservercertificate={yesno(trust)}&autocommit=True"
+        url = URL.create(
+            "mssql+pytds", username=user, password=password, host=server, port=1433, database=database,
+            query={"encrypt": yesno(encrypt), "trustservercertificate": yesno(trust), "autocommit": "True"},
         )
-        eng = create_engine(url, pool_pre_ping=True, pool_recycle=180)
-        with eng.begin() as c:
+        # Sin pool_pre_ping (un SELECT 1 extra por checkout): la salud del pool la revisa check_engine
+        eng = create_engine(
+            url, pool_pre_ping=False, pool_recycle=1800, pool_size=10, max_overflow=20,
+            connect_args={"login_timeout": 5, "timeout": 30},
+        )
+        # Solo corre al crear el engine (cache miss): valida credenciales para el login
+        with eng.connect() as c:
             c.execute(text("SELECT 1"))
         return eng
 
+    @st.cache_resource(ttl=300, show_spinner=False)
+    def check_engine(engine_id: int, _engine) -> float:
+        """SELECT 1 como mucho cada 5 minutos por engine; si falla, descarta las conexiones del pool."""
+        try:
+            with _engine.connect() as c:
+                c.execute(text("SELECT 1"))
+        except Exception:
+            _engine.dispose()
+            raise
+        return time.time()
+
+    @st.cache_data(ttl=300, show_spinner=False)
+    def load_plataformas(engine_key: str, _engine) -> list:
+        # _engine no se hashea: engine_key (servidor/base/usuario) separa la caché entre logins
+        with _engine.connect() as c:
+            rows = c.execute(text("""
+                SELECT DISTINCT Plataforma FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs]
+                WHERE FechaAlta >= DATEADD(day, -30, CAST(GETDATE() AS date)) AND Plataforma IS NOT NULL
+                ORDER BY Plataforma"""))
+            return ['(todas)'] + [r[0] for r in rows]
+
     def secrets_ok():
         try:
             s = st.secrets
@@ -95,8 +188,6 @@ def monitor_ui():
                 s["DB_SERVER"], s["DB_NAME"], s["DB_USER"], s["DB_PASS"],
                 s.get("DB_ENCRYPT","yes"), s.get("DB_TRUST","yes")
             )
-            # Oculta la sidebar si usamos secrets
-            st.markdown("<style>[data-testid='stSidebar'],[data-testid='collapsedControl']{display:none!important}</style>", unsafe_allow_html=True)
         except Exception as e:
             st.error(f"No se pudo conectar con secrets: {e}")
             return
@@ -104,9 +195,6 @@ def monitor_ui():
         if 'auth' not in st.session_state: st.session_state.auth = False
         with st.sidebar:
             st.header("Login SQL Server")
-            st.markdown("""
-            <style>button[aria-label="Show password text"],button[aria-label="Hide password text"]{display:none!important}</style>
-            """, unsafe_allow_html=True)
             with st.form("login", clear_on_submit=False):
                 server   = st.text_input("Servidor")
                 database = st.text_input("Base de datos")
@@ -123,10 +211,21 @@ def monitor_ui():
             except Exception as e:
                 st.error(f"Error de conexión: {e}")
         if not engine:
+            st.markdown(f"<style>{HIDE_PASSWORD_TOGGLE_CSS}</style>", unsafe_allow_html=True)
             st.info("Conéctate en la barra lateral para comenzar.")
             return
-        else:
-            st.markdown("<style>[data-testid='stSidebar'],[data-testid='collapsedControl']{display:none!important}</style>", unsafe_allow_html=True)
+
+    try:
+        check_engine(id(engine), engine)
+    except Exception as e:
+        st.error(f"Se perdió la conexión con SQL Server: {e}")
+        return
+
+    # Identidad del engine para las claves de caché: sin ella, un login vería datos cacheados de otro
+    engine_key = str(engine.url)
+
+    # Conectados: oculta la sidebar y define las clases del semáforo
+    st.markdown(_STATIC_CSS, unsafe_allow_html=True)
 
     # -------- Filtros --------
     if 'page' not in st.session_state: st.session_state.page = 1
@@ -135,8 +234,12 @@ def monitor_ui():
     with c1:
         page_size = st.selectbox("Filas por página", [50,100,200,500], index=1)
     with c2:
-        plataformas = ['EDI']
-        plataforma_sel = st.selectbox('Plataforma (server-side)', plataformas, index=0)
+        try:
+            plataformas = load_plataformas(engine_key, engine)
+        except Exception:
+            plataformas = ['(todas)', 'EDI']
+        plataforma = st.selectbox('Plataforma (server-side)', plataformas,
+                                  index=plataformas.index('EDI') if 'EDI' in plataformas else 0)
     with c3:
         st.caption("Consulta limitada a los últimos 30 días (server-side).")
 
@@ -144,65 +247,140 @@ def monitor_ui():
     start_date = datetime.now().date() - timedelta(days=30)
     plat_param = None if plataforma == '(todas)' else plataforma
 
+    # Estado de los checkboxes "Ver SOLO ..." (se resuelve antes de consultar: el filtro es server-side)
+    if 'show_only_crit' not in st.session_state: st.session_state.show_only_crit = False
+    if 'show_only_ok'   not in st.session_state: st.session_state.show_only_ok   = False
+    if 'last_toggle'    not in st.session_state: st.session_state.last_toggle    = None  # 'crit'|'ok'|None
+
+    if st.session_state.show_only_crit and st.session_state.show_only_ok:
+        keep = st.session_state.last_toggle or 'crit'
+        if keep == 'crit': st.session_state.show_only_ok = False
+        else:              st.session_state.show_only_crit = False
+
+    crit_param = 1 if st.session_state.show_only_crit else 0 if st.session_state.show_only_ok else None
+
     # -------- SQL --------
-    SQL_COUNT = """
-    SELECT COUNT(*) AS total
+    # Clasificación crítico/OK resuelta en SQL Server (1 = crítico): la usan el filtro y la columna IsCritical
+    # COLLATE CI explícito: la comparación no depende de la collation de la columna (como el viejo re.IGNORECASE)
+    SQL_IS_CRITICAL = "CASE WHEN " + " OR ".join(
+        f"j.MotivoRechazo COLLATE Latin1_General_CI_AS LIKE '%{lit}%'" for lit in CRITICAL_MOTIVOS
+    ) + " THEN 1 ELSE 0 END"
+    # Filtros opcionales: se agregan solo cuando aplican (un "(:p IS NULL OR ...)" impide el seek por índice)
+    SQL_PLAT_FILTER = """
+      AND j.Plataforma = :plat
+    """
+    SQL_CRIT_FILTER = f"""
+      AND ({SQL_IS_CRITICAL}) = :crit
+    """
+    # Índice de cobertura sugerido para COUNT y páginas filtradas por plataforma:
+    #   CREATE INDEX IX_LegacyJobs_Plat_Fecha ON [dbo].[LegacyJobs] (Plataforma, FechaAlta DESC, Id DESC)
+    #   INCLUDE (Metodo, MotivoRechazo, IdEmpresa)
+    # Conteos sin el filtro crítico/OK: el semáforo muestra siempre ambos lados
+    SQL_COUNT = f"""
+    SELECT COUNT(*) AS total, SUM({SQL_IS_CRITICAL}) AS crit
     FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] j
     LEFT JOIN [PortalIntegradoGS1BD].[dbo].[Empresas] e ON e.IdEmpresa = j.IdEmpresa
     WHERE j.FechaAlta >= :start AND j.FechaAlta < :end
-      AND (:plat IS NULL OR j.Plataforma = :plat)
     """
-    SQL_PAGE = """
+    # Paginación keyset (seek) sobre (FechaAlta, Id): el costo de la página N es el mismo que el de la 1.
+    # Requiere índice: CREATE INDEX IX_LegacyJobs_FechaAlta_Id ON [dbo].[LegacyJobs] (FechaAlta DESC, Id DESC)
+    SQL_PAGE = f"""
     SELECT j.Id, j.FechaAlta, j.Plataforma, j.Metodo,
            j.MotivoRechazo, j.IdEmpresa,
-           e.CodEmpre, e.RazonSocial, e.CUIT
+           e.CodEmpre, e.RazonSocial, e.CUIT,
+           {SQL_IS_CRITICAL} AS IsCritical
     FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] j
     LEFT JOIN [PortalIntegradoGS1BD].[dbo].[Empresas] e ON e.IdEmpresa = j.IdEmpresa
     WHERE j.FechaAlta >= :start AND j.FechaAlta < :end
-      AND (:plat IS NULL OR j.Plataforma = :plat)
-    ORDER BY j.FechaAlta DESC
-    OFFSET :off ROWS FETCH NEXT :psz ROWS ONLY;
     """
+    # La FechaAlta de corte se lee de la propia fila (por Id): se compara en el tipo y precisión de la columna,
+    # sin pasar por un parámetro datetime2 del driver que no empataría con valores datetime/datetime2(7)
+    SQL_SEEK = """
+      AND (j.FechaAlta < (SELECT b.FechaAlta FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] b WHERE b.Id = :last_id)
+           OR (j.FechaAlta = (SELECT b.FechaAlta FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] b WHERE b.Id = :last_id)
+               AND j.Id < :last_id))
+    """
+    SQL_ORDER = """
+    ORDER BY j.FechaAlta DESC, j.Id DESC
+    OFFSET :off ROWS FETCH NEXT :psz ROWS ONLY
+    """
+    # Con plataforma fija el plan se recompila: evita reusar un plan "olfateado" para otra plataforma
+    SQL_RECOMPILE = "OPTION (RECOMPILE)"
+
+    def sql_filters(plat, crit) -> str:
+        return (SQL_PLAT_FILTER if plat is not None else "") + (SQL_CRIT_FILTER if crit is not None else "")
+
+    # Si cambian los filtros se reinicia la paginación
+    filter_key = (start_date, end_date, plat_param, crit_param, page_size)
+    if st.session_state.get('filter_key') != filter_key:
+        st.session_state.filter_key = filter_key
+        st.session_state.page = 1
+        st.session_state.page_cursors = {}  # página -> Id de la última fila de la página anterior
 
     page = st.session_state.page
     offset = max((page-1)*page_size, 0)
+    cursors = st.session_state.page_cursors
+    cursor = cursors.get(page) if page > 1 else None  # página aún no visitada (p.ej. "Ir a página") => OFFSET
+
+    # COUNT con TTL largo y clave sin offset/cursor ni filtro crítico/OK: paginar o alternar los checkboxes no lo recalcula
+    # El engine se toma del closure; engine_key lo identifica en la clave de caché
+    @st.cache_data(ttl=300, max_entries=16, show_spinner=False)
+    def fetch_count(engine_key, start, end, plat) -> tuple[int, int]:
+        """Devuelve (total, críticos) del período y plataforma."""
+        with engine.connect() as conn:
+            sql_count = SQL_COUNT + sql_filters(plat, None) + (SQL_RECOMPILE if plat is not None else "")
+            row = conn.execute(text(sql_count), {"start": start, "end": end, "plat": plat}).one()
+            return int(row.total or 0), int(row.crit or 0)
+
+    @st.cache_data(ttl=60, max_entries=32, show_spinner="Cargando página…")
+    def fetch_page(engine_key, start, end, plat, crit, offset, psz, cursor=None) -> pd.DataFrame:
+        params = {"start": start, "end": end, "plat": plat, "crit": crit, "off": offset, "psz": psz}
+        sql_page = SQL_PAGE + sql_filters(plat, crit)
+        if cursor is not None:
+            params.update(off=0, last_id=cursor)
+            sql_page += SQL_SEEK
+        sql_page += SQL_ORDER + (SQL_RECOMPILE if plat is not None else "")
+        with engine.connect() as conn:
+            # Tipos compactos resueltos en la misma lectura, antes de cachear la página
+            return pd.read_sql_query(
+                text(sql_page).execution_options(stream_results=True), conn, params=params,
+                parse_dates=["FechaAlta"], dtype={"Id": "int64", "Plataforma": "category", "IsCritical": "bool"},
+            )
 
-    with engine.begin() as conn:
-        total = conn.execute(text(SQL_COUNT), {"start": start_date, "end": end_date, "plat": plat_param}).scalar() or 0
-
-    with engine.begin() as conn:
-        rs = conn.execute(text(SQL_PAGE), {"start": start_date, "end": end_date, "plat": plat_param, "off": offset, "psz": page_size})
-        rows = rs.fetchall(); cols = list(rs.keys())
-        df = pd.DataFrame(rows, columns=cols) if rows else pd.DataFrame(columns=cols or
-             ["Id","FechaAlta","Plataforma","Metodo","MotivoRechazo","IdEmpresa","CodEmpre","RazonSocial","CUIT"])
+    def with_retry(fn, *args):
+        """Sin pre-ping, una conexión caída del pool aparece recién al usarla: se reintenta una vez."""
+        try:
+            return fn(*args)
+        except DBAPIError as e:
+            if not e.connection_invalidated:
+                raise
+            return fn(*args)  # SQLAlchemy ya invalidó la conexión; el reintento toma otra del pool
 
-    # -------- Semáforo --------
-    critical_pattern = r'(Error al dar de alta la empresa|Error en el alta de la empresa\.\s*-\s*Invalid argument supplied for foreach\(\)|No existe la empresa, no se creo el usuario|No existe el usuario, no se creo el usuario)'
-    crit_mask = df['MotivoRechazo'].astype(str).str.contains(critical_pattern, case=False, na=False)
-    crit_count = int(crit_mask.sum())
-    ok_count   = int(len(df) - crit_count)
+    try:
+        df = with_retry(fetch_page, engine_key, start_date, end_date, plat_param, crit_param, offset, page_size, cursor)
+        crit_mask = df['IsCritical']  # bool calculado en SQL, reusado en la tabla
+        if page == 1 and len(df) < page_size and crit_param is None:
+            total_all, crit_count = len(df), int(crit_mask.sum())  # todo cabe en la primera página: no hace falta el COUNT
+        else:
+            total_all, crit_count = with_retry(fetch_count, engine_key, start_date, end_date, plat_param)
+    except Exception as e:
+        st.error(f"Error al consultar SQL Server: {e}")
+        return
+    if not df.empty:  # cualquier página cargada (incluso por OFFSET) deja lista la clave de la siguiente
+        cursors[page+1] = int(df['Id'].iat[-1])
+    ok_count = total_all - crit_count
+    total = total_all if crit_param is None else crit_count if crit_param == 1 else ok_count  # filas del filtro actual
+    total_pages = max((total + page_size - 1) // page_size, 1)
 
+    # -------- Semáforo (período completo, independiente de los checkboxes) --------
     a,b = st.columns(2)
-    a.markdown(f"""<div style="padding:20px;border-radius:16px;background:#ff4d4f;color:white;font-weight:900;
-    font-size:28px;text-align:center;box-shadow:0 8px 20px rgba(255,77,79,.45);margin-bottom:14px;">🔴 ERROR: {crit_count}</div>""",
-               unsafe_allow_html=True)
-    b.markdown(f"""<div style="padding:20px;border-radius:16px;background:#06c1671a;color:#0e7a3f;font-weight:900;
-    font-size:28px;text-align:center;border:3px solid #23c16b;box-shadow:0 8px 20px rgba(35,193,107,.35);margin-bottom:14px;">🟢 OK: {ok_count}</div>""",
-               unsafe_allow_html=True)
+    a.markdown(f"<div class='sem-card sem-err'>🔴 ERROR: {crit_count}</div>", unsafe_allow_html=True)
+    b.markdown(f"<div class='sem-card sem-ok'>🟢 OK: {ok_count}</div>", unsafe_allow_html=True)
 
     m1,m2,m3,m4 = st.columns(4)
-    m1.metric('Total últimos 30 días', total); m2.metric('Página', page); m3.metric('Filas página', len(df)); m4.metric('Plataforma', plataforma)
+    m1.metric('Total últimos 30 días', total_all); m2.metric('Página', page); m3.metric('Filas página', len(df)); m4.metric('Plataforma', plataforma)
 
     # -------- Checkboxes excluyentes --------
-    if 'show_only_crit' not in st.session_state: st.session_state.show_only_crit = False
-    if 'show_only_ok'   not in st.session_state: st.session_state.show_only_ok   = False
-    if 'last_toggle'    not in st.session_state: st.session_state.last_toggle    = None  # 'crit'|'ok'|None
-
-    if st.session_state.show_only_crit and st.session_state.show_only_ok:
-        keep = st.session_state.last_toggle or 'crit'
-        if keep == 'crit': st.session_state.show_only_ok = False
-        else:              st.session_state.show_only_crit = False
-
     prev_crit = st.session_state.show_only_crit
     prev_ok   = st.session_state.show_only_ok
 
@@ -219,13 +397,8 @@ def monitor_ui():
     elif (not st.session_state.show_only_crit and prev_crit) or (not st.session_state.show_only_ok and prev_ok):
         st.session_state.last_toggle = None
 
-    # Dataset a mostrar
-    if st.session_state.show_only_crit:
-        display_df = df[crit_mask]
-    elif st.session_state.show_only_ok:
-        display_df = df[~crit_mask]
-    else:
-        display_df = df
+    # Dataset a mostrar (ya filtrado en SQL según los checkboxes)
+    display_df = df
 
     # -------- Navegación --------
     c1, c2, c3, c4 = st.columns([1, 1, 3, 3])
@@ -234,120 +407,51 @@ def monitor_ui():
         st.session_state.page = max(page - 1, 1)
         st.rerun()
 
-    if c2.button("Siguiente ➡️", disabled=(offset + page_size >= total)):
+    if c2.button("Siguiente ➡️", disabled=(page >= total_pages)):
         st.session_state.page = page + 1
         st.rerun()
 
     goto = c3.number_input(
         "Ir a página",
         min_value=1,
-        max_value=max((total + page_size - 1) // page_size, 1),
-        value=page,
+        max_value=total_pages,
+        value=min(page, total_pages),
         step=1,
     )
     if c4.button("Ir"):
         st.session_state.page = int(goto)
         st.rerun()
 
-    # -------- Tabla con botón Copiar (iframe) --------
+    # -------- Tabla --------
     st.markdown("### Resultados")
     if not display_df.empty:
-        df_show = display_df.rename(columns={"MotivoRechazo":"Respuestas"}).copy()
-        df_show["FechaAlta"] = pd.to_datetime(df_show["FechaAlta"], errors="coerce")
-        cols_show = ['Id','FechaAlta','Plataforma','CodEmpre','RazonSocial','CUIT','Respuestas']
-        cols_show = [c for c in cols_show if c in df_show.columns]
-
-        critical_re = re.compile(critical_pattern, re.IGNORECASE)
-        def td_copy(val):
-            return (
-                f"<td class='copy-cell'>"
-                f"<span class='cell-text'>{esc(val)}</span>"
-                f"<button class='copybtn' data-text='{esc(val)}' title='Copiar'>📋</button>"
-                f"</td>"
-            )
+        # Solo las columnas visibles (MotivoRechazo se rotula "Respuestas")
+        cols_show = ['Id','FechaAlta','Plataforma','CodEmpre','RazonSocial','CUIT','MotivoRechazo']
+        df_show = display_df[cols_show]
+        row_crit = crit_mask.to_numpy()
 
-        rows_html = []
-        for _, r in df_show[cols_show].iterrows():
-            row_class = "row-critical" if critical_re.search(str(r.get('Respuestas') or "")) else "row-ok"
-            rows_html.append(
-                f"<tr class='{row_class}'>"
-                f"<td>{esc(r.get('Id'))}</td>"
-                f"<td>{esc(r.get('FechaAlta'))}</td>"
-                f"<td>{esc(r.get('Plataforma'))}</td>"
-                f"{td_copy(r.get('CodEmpre'))}"
-                f"<td>{esc(r.get('RazonSocial'))}</td>"
-                f"{td_copy(r.get('CUIT'))}"
-                f"{td_copy(r.get('Respuestas'))}"
-                f"</tr>"
+        if USE_FAST_RENDER:
+            st.html(results_table_html(df_show, row_crit))
+        else:
+            # Estilos de toda la tabla en una sola llamada NumPy (sin callback por fila), a partir del semáforo
+            def table_style(frame: pd.DataFrame) -> pd.DataFrame:
+                css = np.where(row_crit[:, None], "background-color:#ff4d4f;color:white;", "background-color:#eaffea;color:black;")
+                return pd.DataFrame(np.broadcast_to(css, frame.shape), index=frame.index, columns=frame.columns)
+
+            copy_help = "Seleccioná la celda y usá Ctrl+C para copiar"
+            st.dataframe(
+                df_show.style.apply(table_style, axis=None),
+                use_container_width=True,
+                hide_index=True,
+                height=min(max(38 + 35 * len(df_show), 300), 2000),
+                column_config={
+                    "Id": st.column_config.NumberColumn("Id", format="%d"),
+                    "FechaAlta": st.column_config.DatetimeColumn("FechaAlta", format="YYYY-MM-DD HH:mm:ss"),
+                    "CodEmpre": st.column_config.TextColumn("CodEmpre", help=copy_help),
+                    "CUIT": st.column_config.TextColumn("CUIT", help=copy_help),
+                    "MotivoRechazo": st.column_config.TextColumn("Respuestas", help=copy_help, width="large"),
+                },
             )
-
-        html_doc = f"""
-        <!doctype html>
-        <html>
-        <head>
-          <meta charset="utf-8"/>
-          <style>
-            body {{ margin:0; font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,"Helvetica Neue",Arial; }}
-            .gs1tbl {{ width:100%; border-collapse:collapse; }}
-            .gs1tbl th, .gs1tbl td {{ border:1px solid #e5e7eb; padding:8px; font-size:14px; vertical-align:top; }}
-            .gs1tbl th {{ background:#f8fafc; text-align:left; position:sticky; top:0; z-index:1; }}
-            .copy-cell {{ white-space:nowrap; }}
-            .copybtn {{
-              margin-left:8px; cursor:pointer; border:0; background:#eef2ff; color:#1f2937;
-              border-radius:6px; padding:2px 6px; font-size:12px;
-            }}
-            .copybtn.ok {{ background:#d1fae5; }}
-            .row-critical td {{ background:#ff4d4f; color:white; }}
-            .row-ok td {{ background:#eaffea; color:black; }}
-          </style>
-        </head>
-        <body>
-          <table class="gs1tbl">
-            <thead>
-              <tr>
-                <th>Id</th><th>FechaAlta</th><th>Plataforma</th>
-                <th>CodEmpre</th><th>RazonSocial</th><th>CUIT</th><th>Respuestas</th>
-              </tr>
-            </thead>
-            <tbody>
-              {''.join(rows_html)}
-            </tbody>
-          </table>
-
-          <script>
-            (function(){{
-              function copyFallback(text) {{
-                const ta = document.createElement('textarea');
-                ta.value = text; ta.style.position='fixed'; ta.style.opacity='0';
-                document.body.appendChild(ta); ta.focus(); ta.select();
-                try {{ document.execCommand('copy'); }} catch(e) {{}}
-                document.body.removeChild(ta);
-              }}
-              document.addEventListener('click', function(ev){{
-                const btn = ev.target.closest('.copybtn');
-                if(!btn) return;
-                const text = btn.getAttribute('data-text') || '';
-                if (navigator.clipboard && navigator.clipboard.writeText) {{
-                  navigator.clipboard.writeText(text).catch(function(){{ copyFallback(text); }});
-                }} else {{
-                  copyFallback(text);
-                }}
-                const old = btn.textContent; btn.textContent='✓'; btn.classList.add('ok');
-                setTimeout(function(){{ btn.textContent=old; btn.classList.remove('ok'); }}, 900);
-              }});
-              function postHeight(){{
-                const h = document.documentElement.scrollHeight || document.body.scrollHeight;
-                parent.postMessage({{ stHeight: h }}, "*");
-              }}
-              setTimeout(postHeight, 50); setTimeout(postHeight, 200); setTimeout(postHeight, 600);
-            }})();
-          </script>
-        </body>
-        </html>
-        """
-
-        est_height = 420 + 22 * len(df_show)
-        components.html(html_doc, height=min(max(est_height, 300), 2000), scrolling=True)
     else:
         st.warning("No hay resultados para los filtros actuales.")
 
@@ -357,20 +461,55 @@ def monitor_ui():
     if not display_df.empty:
         left,right = st.columns([1,2])
         with left:
-            job_id = st.selectbox("Selecciona un Job Id para ver su XML de Parametros", options=list(display_df['Id']))
-        SQL_XML = """SELECT CAST(Parametros AS NVARCHAR(MAX)) AS ParametrosXml
+            # Opciones acotadas (lista de ints nativos): menos costo de hash del widget en cada rerun
+            ids = display_df['Id'].to_numpy(dtype=np.int64)
+            # Elegir en el selector limpia el Id escrito: así el texto solo manda mientras es la última elección
+            def _clear_otro_id():
+                st.session_state.xml_otro_id = ""
+            job_id = st.selectbox("Selecciona un Job Id para ver su XML de Parametros", options=ids[:XML_ID_OPTIONS].tolist(),
+                                  on_change=_clear_otro_id)
+            otro_id = st.text_input("…o escribe otro Job Id", key="xml_otro_id").strip()
+            if otro_id.isdecimal():
+                job_id = int(otro_id)
+            elif otro_id:
+                st.warning("El Job Id debe ser numérico.")
+        # Vista previa: solo los primeros XML_HEAD_CHARS caracteres viajan por TDS; el XML completo, a pedido.
+        # El completo se lee como columna XML nativa, sin CAST a NVARCHAR(MAX).
+        SQL_XML_HEAD = f"""SELECT SUBSTRING(CAST(Parametros AS NVARCHAR(MAX)), 1, {XML_HEAD_CHARS}) AS Head,
+                                  DATALENGTH(Parametros) AS FullLen
+                           FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] WHERE Id = :id"""
+        SQL_XML = """SELECT Parametros
                      FROM [PortalIntegradoGS1BD].[dbo].[LegacyJobs] WHERE Id = :id"""
-        xml_text = ''
+
+        # Cacheado por (engine, Job Id, completo): re-seleccionar el mismo job no vuelve a SQL ni re-parsea
+        @st.cache_data(ttl=600, max_entries=128, show_spinner=False)
+        def fetch_pretty_xml(engine_key: str, job_id: int, full: bool = False) -> tuple[str, int | None]:
+            """Devuelve (xml formateado, bytes totales si la vista quedó truncada)."""
+            with engine.connect() as conn:
+                if full:
+                    row = conn.execute(text(SQL_XML), {"id": job_id}).fetchone()
+                    return (prettify_xml(row[0]) if row and row[0] else ''), None
+                row = conn.execute(text(SQL_XML_HEAD), {"id": job_id}).fetchone()
+            if not row or not row[0]:
+                return '', None
+            truncated = len(row[0]) >= XML_HEAD_CHARS
+            return prettify_xml(row[0]), (row[1] if truncated else None)
+
+        full = st.session_state.get('xml_full_id') == job_id
+        xml_pretty, full_len = '', None
         try:
-            with engine.begin() as conn:
-                row = conn.execute(text(SQL_XML), {"id": int(job_id)}).fetchone()
-                if row and row[0]: xml_text = str(row[0])
+            xml_pretty, full_len = fetch_pretty_xml(engine_key, int(job_id), full)
         except Exception as e:
             st.error(f"No se pudo obtener el XML: {e}")
         with right:
             st.subheader("XML de Parametros")
-            if xml_text:
-                st.code(prettify_xml(xml_text), language="xml")
+            if xml_pretty:
+                if full_len:
+                    st.caption(f"Vista parcial (primeros {XML_HEAD_CHARS // 1024} K caracteres de ~{full_len // 1024} KB).")
+                    if st.button("Cargar XML completo"):
+                        st.session_state.xml_full_id = job_id
+                        st.rerun()
+                st.code(xml_pretty, language="xml")
             else:
                 st.info("Selecciona un Job con Parametros disponibles.")
 
@@ -404,13 +543,37 @@ def _query_params_to_dict(txt: str) -> dict:
             out[k] = v
     return out
 
+_STREAM_BODY_MIN = 1024 * 1024  # bodies más grandes se envían chunked
+_BODY_CHUNK = 64 * 1024
+
+def _iter_body(txt: str):
+    """Genera el body en bloques UTF-8 para enviarlo chunked sin una copia completa en bytes."""
+    for i in range(0, len(txt), _BODY_CHUNK):
+        yield txt[i:i + _BODY_CHUNK].encode("utf-8")
+
+# Enteros de 19+ dígitos pueden exceder 64 bits: orjson los convertiría en float y perdería precisión
+_LONG_INT_RE = re.compile(r"\d{19,}")
+
 def _pretty_json(text: str) -> str:
+    if not _LONG_INT_RE.search(text):
+        try:
+            return orjson.dumps(orjson.loads(text), option=orjson.OPT_INDENT_2).decode("utf-8")
+        except Exception:
+            pass
     try:
-        obj = json.loads(text)
-        return json.dumps(obj, indent=2, ensure_ascii=False)
+        return json.dumps(json.loads(text), indent=2, ensure_ascii=False)
     except Exception:
         return text
 
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    """Session compartida: reutiliza conexiones TCP/TLS entre envíos."""
+    s = requests.Session()
+    s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))  # sin cookies compartidas entre usuarios
+    s.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+    s.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+    return s
+
 def api_tester_ui():
     st.subheader("API Tester")
 
@@ -452,26 +615,31 @@ def api_tester_ui():
         headers.setdefault("Content-Type", content_type)
 
     data = None
-    json_data = None
     if method in ("POST", "PUT", "PATCH", "DELETE") and raw_body:
         if content_type == "application/json":
             try:
-                json_data = json.loads(raw_body)
+                orjson.loads(raw_body)  # solo valida: se envía el texto tal cual, sin re-serializar
             except Exception as e:
                 st.error(f"Body JSON inválido: {e}")
                 return
+            data = raw_body.encode("utf-8")
+        elif len(raw_body) > _STREAM_BODY_MIN:
+            data = _iter_body(raw_body)  # requests usa Transfer-Encoding: chunked con generadores
+            if allow_redirects:
+                # Un generador no se rebobina: ante un 307/308 requests reenviaría un body vacío
+                allow_redirects = False
+                st.caption("Body grande enviado en chunks: no se siguen redirects (el body no puede reenviarse).")
         else:
             data = raw_body.encode("utf-8")
 
     sent_at = time.perf_counter()
     try:
-        resp = requests.request(
+        resp = get_http_session().request(
             method=method,
             url=url,
             params=params,
             headers=headers,
             data=data,
-            json=json_data,
             timeout=timeout,
             allow_redirects=allow_redirects,
         )
@@ -502,22 +670,20 @@ def api_tester_ui():
             mime=ctype or "application/octet-stream",
         )
 
-    # cURL equivalente
-    curl_parts = [f"curl -X {method}"]
-    for k, v in headers.items():
-        curl_parts.append(f"-H {json.dumps(f'{k}: {v}')}")
-    if params:
-        qs = urlencode(params, doseq=True)
-        full_url = url + ("&" if "?" in url else "?") + qs
-    else:
-        full_url = url
-    if json_data is not None:
-        curl_parts.append(f"--data {json.dumps(json.dumps(json_data))}")
-    elif data is not None and len(data) > 0:
-        curl_parts.append(f"--data {json.dumps(data.decode('utf-8'))}")
-    curl_parts.append(json.dumps(full_url))
-    st.caption("cURL")
-    st.code(" \\\n  ".join(curl_parts), language="bash")
+    # cURL equivalente (plegado; el body se cita tal cual, sin re-serializar el JSON)
+    with st.expander("cURL", expanded=False):
+        curl_parts = [f"curl -X {method}"]
+        for k, v in headers.items():
+            curl_parts.append(f"-H {shlex.quote(f'{k}: {v}')}")
+        if params:
+            qs = urlencode(params, doseq=True)
+            full_url = url + ("&" if "?" in url else "?") + qs
+        else:
+            full_url = url
+        if data:
+            curl_parts.append(f"--data {shlex.quote(raw_body)}")
+        curl_parts.append(shlex.quote(full_url))
+        st.code(" \\\n  ".join(curl_parts), language="bash")
 
 # ===================== TABS PRINCIPALES =====================
 tab_monitor, tab_api = st.tabs(["📊 Monitor GS1→EDI", "🧪 API Tester"])